@@ -23,6 +23,11 @@ DEALINGS IN THE SOFTWARE.
 """
 import discord
 import importlib
+import importlib.util
+import inspect
+import logging
+import os
+import sys
 
 
 __all__ = (
@@ -37,6 +42,32 @@ __all__ = (
 )
 
 
+log = logging.getLogger(__name__)
+
+# (file path, file mtime) that each extension module last ran from, by extension name.
+# A new tuple is stored every time a module runs, so clients can tell by identity
+# whether the module has been reloaded since they cached its setup function.
+_module_stamps = {}
+
+
+def _get_mtime(path):
+    if path is None:
+        return None
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _get_origin(extension_name):
+    spec = importlib.util.find_spec(extension_name)
+    if spec is None or not spec.has_location:
+        return None
+
+    return spec.origin
+
+
 class ModularCommandClientException(Exception):
     """Base exception class for modular command client errors."""
     pass
@@ -74,6 +105,8 @@ class CommandCollection:
     This class should be subclassed to create new command collections.
     """
 
+    __slots__ = ("client", "commands", "name", "description", "_name_lower")
+
     def __init__(
         self,
         client,
@@ -85,6 +118,8 @@ class CommandCollection:
         self.client = client
         self.commands = commands
         self.name = name or self.__class__.__name__
+        # The key the collection is loaded under, updated by load_command_collection
+        self._name_lower = self.name.lower()
         if description:
             self.description = description
         else:
@@ -94,39 +129,42 @@ class CommandCollection:
             else:
                 self.description = "No description provided."
 
-        # Attach collection_check to each command callback
-        for cmd in commands:
-            self._wrap_callback_with_check(cmd)
+        # Attach collection_check to each command callback, unless it is not overridden
+        if type(self).collection_check is not CommandCollection.collection_check:
+            for cmd in commands:
+                self._wrap_callback_with_check(cmd)
 
-            if check_children:
-                for child in self._get_all_children(cmd):
-                    self._wrap_callback_with_check(child)
+                if check_children:
+                    for child in self._get_all_children(cmd):
+                        self._wrap_callback_with_check(child)
 
     def _wrap_callback_with_check(self, command) -> None:
-        def cmd_with_collection_check(function):
-            async def wrapper(cmd):
-                try:
-                    await discord.utils.maybe_coroutine(self.collection_check, cmd)
-                except Exception as ex:
-                    return await discord.utils.maybe_coroutine(
-                        self.handle_collection_check_error, cmd, ex
-                    )
+        check = self.collection_check
+        handle_error = self.handle_collection_check_error
+        function = command.callback
 
-                return await function(cmd)
+        async def wrapper(cmd):
+            try:
+                result = check(cmd)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as ex:
+                return await discord.utils.maybe_coroutine(handle_error, cmd, ex)
 
-            return wrapper
+            return await function(cmd)
 
-        command.callback = cmd_with_collection_check(command.callback)
+        command.callback = wrapper
 
     def _get_all_children(self, command) -> list:
-        children = []
+        children, stack = [], [command]
 
-        if command._children_:
-            for child in command._children_.values():
-                children.append(child)
+        while stack:
+            node_children = stack.pop()._children_
 
-                if child._children_:
-                    children.extend(self._get_all_children(child))
+            if node_children:
+                values = node_children.values()
+                children.extend(values)
+                stack.extend(values)
 
         return children
 
@@ -163,6 +201,8 @@ class ModularCommandClientBase:
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.command_collections = {}
+        # (module, setup function, module stamp) of loaded extensions, by extension name
+        self._module_cache = {}
 
     def load_extension(self, extension_name: str) -> None:
         """
@@ -171,6 +211,8 @@ class ModularCommandClientBase:
         and returns a list of CommandCollection objects.
         Before returning the list of CommandCollection objects, the setup function can
         be used to also do some other initialization.
+        If this client has loaded the module before, the module is reloaded only if its
+        file has been modified since then. Use force_reload_extension to always reload it.
 
         Parameters:
             extension_name (str): The name of the module to load with importlib.
@@ -188,11 +230,26 @@ class ModularCommandClientBase:
         Raises:
             ModuleSetupException: Raised when the module setup fails.
         """
-        module = importlib.import_module(extension_name)
+        self._load_extension(extension_name, force_reload=False)
 
-        setup_function = getattr(module, "setup", None)
-        if not setup_function:
-            raise ModuleSetupException(f"Module {module} does not have a setup function")
+    def force_reload_extension(self, extension_name: str) -> None:
+        """
+        Reloads a module with importlib, even if its file has not been modified,
+        and sets up its command collections.
+        The command collections of the module should be unloaded before calling this.
+        Otherwise, works the same way as load_extension.
+
+        Parameters:
+            extension_name (str): The name of the module to reload with importlib.
+
+        Raises:
+            ModuleSetupException: Raised when the module setup fails.
+        """
+        self._load_extension(extension_name, force_reload=True)
+
+    def _load_extension(self, extension_name: str, force_reload: bool) -> None:
+        log.debug("Loading extension: %s", extension_name)
+        module, setup_function = self._get_setup_function(extension_name, force_reload)
 
         try:
             command_collections = setup_function(self)
@@ -202,6 +259,41 @@ class ModularCommandClientBase:
         for collection in command_collections:
             self.load_command_collection(collection)
 
+    def _get_setup_function(self, extension_name: str, force_reload: bool) -> tuple:
+        module = sys.modules.get(extension_name)
+        stamp = _module_stamps.get(extension_name)
+
+        # The mtime is read before the module runs, so that edits made while it is
+        # running are picked up by the next load
+        if module is None:
+            path = _get_origin(extension_name)
+            stamp = (path, _get_mtime(path))
+            module = importlib.import_module(extension_name)
+        elif force_reload or stamp is not None:
+            path = getattr(module, "__file__", None) if force_reload else stamp[0]
+            mtime = _get_mtime(path)
+
+            if force_reload or mtime != stamp[1]:
+                log.debug("Reloading extension: %s", extension_name)
+                stamp = (path, mtime)
+                module = importlib.reload(module)
+            else:
+                cached = self._module_cache.get(extension_name)
+                if cached is not None and cached[0] is module and cached[2] is stamp:
+                    return module, cached[1]
+        else:
+            # Imported outside of load_extension, so the file it ran from is of unknown age.
+            # It is reloaded on the next load, if it has a file.
+            stamp = (getattr(module, "__file__", None), None)
+
+        setup_function = getattr(module, "setup", None)
+        if not setup_function:
+            raise ModuleSetupException(f"Module {module} does not have a setup function")
+
+        _module_stamps[extension_name] = stamp
+        self._module_cache[extension_name] = (module, setup_function, stamp)
+        return module, setup_function
+
     def get_command_collection(self, collection_name: str) -> CommandCollection:
         """
         Returns a loaded CommandCollection object by its name. (non case sensitive)
@@ -231,9 +323,13 @@ class ModularCommandClientBase:
         if collection_name in self.command_collections:
             raise CollectionAlreadyLoadedException(f"Collection {collection} is already loaded")
 
+        log.debug("Loading collection: %s", collection.name)
+
         for command in collection.commands:
+            log.debug("Adding %s command", command._name_)
             self.application_command(command)
 
+        collection._name_lower = collection_name
         self.command_collections[collection_name] = collection
 
     def unload_command_collection(self, collection: CommandCollection) -> None:
@@ -248,21 +344,28 @@ class ModularCommandClientBase:
             CommandCollectionNotLoadedException: Raised when trying to unload a collection
             that is not loaded.
         """
-        collection_name = collection.name.lower()
+        collection_name = collection._name_lower
 
         if collection_name not in self.command_collections:
             raise CollectionNotLoadedException(f"Collection {collection} is not loaded")
 
+        log.debug("Unloading collection: %s", collection.name)
         collection.on_unload()
         del self.command_collections[collection_name]
 
     @discord.utils.copy_doc(discord.Client.close)
     async def close(self) -> None:
-        for _, collection in tuple(self.command_collections.items()):
+        command_collections = self.command_collections
+
+        for collection in list(command_collections.values()):
+            # Could have been unloaded by the on_unload of another collection
+            if collection._name_lower not in command_collections:
+                continue
+
             try:
                 self.unload_command_collection(collection)
             except Exception:
-                pass
+                log.exception("Failed to unload collection %s", collection.name)
 
         await super().close()
 